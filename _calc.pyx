@@ -0,0 +1,277 @@
+# cython: language_level=3
+# cython: boundscheck=False, wraparound=False
+
+# calculator.calculate 的 C 实现：单遍扫描 + 优先级爬升，数字栈和游标
+# 全部是 C 层变量。编译方式见 setup.py；没编译时 calculator.py 自动回退
+# 纯 Python 流水线。
+
+
+# calculator.py 导入本模块后通过 set_error_class 注入 CalcError。
+# 不能在这里 from calculator import：当 calculator.py 以脚本方式运行时
+# （模块名是 __main__），那样会把它重复导入一份，得到另一个 CalcError 类
+_error_class = Exception
+
+
+def set_error_class(cls):
+    global _error_class
+    _error_class = cls
+
+
+cdef object _calc_error(str msg):
+    return _error_class(msg)
+
+
+cdef class _Parser:
+    cdef bytes data
+    cdef const char* s
+    cdef Py_ssize_t pos
+    cdef Py_ssize_t n
+
+    def __cinit__(self, bytes data):
+        self.data = data
+        self.s = data
+        self.pos = 0
+        self.n = len(data)
+
+    cdef void skip_ws(self) noexcept:
+        cdef char c
+        while self.pos < self.n:
+            c = self.s[self.pos]
+            if c == 32 or (9 <= c <= 13):
+                self.pos += 1
+            else:
+                break
+
+    cdef double parse_primary(self) except *:
+        cdef char c
+        cdef Py_ssize_t start
+        cdef double v
+
+        self.skip_ws()
+        if self.pos >= self.n:
+            raise _calc_error("表达式不完整")
+
+        c = self.s[self.pos]
+        if c == ord('('):
+            self.pos += 1
+            v = self.parse_expr(1)
+            self.skip_ws()
+            # _prescan 保证括号配对，走到这儿卡住的只能是并排的操作数
+            # （"(1 2)" 这类），纯 Python 路径对它报"表达式不完整"
+            if self.pos >= self.n or self.s[self.pos] != ord(')'):
+                raise _calc_error("表达式不完整")
+            self.pos += 1
+            return v
+
+        if c == ord('-'):
+            self.pos += 1
+            return -self.parse_primary()
+
+        # 数字字面量的文法和 Python 端的 _NUM_RE 保持一致：
+        # \d+(\.\d*)? 或 \.\d+，多余的 '.' 留给上层按"表达式不完整"处理
+        if ord('0') <= c <= ord('9'):
+            start = self.pos
+            while self.pos < self.n and ord('0') <= self.s[self.pos] <= ord('9'):
+                self.pos += 1
+            if self.pos < self.n and self.s[self.pos] == ord('.'):
+                self.pos += 1
+                while self.pos < self.n and ord('0') <= self.s[self.pos] <= ord('9'):
+                    self.pos += 1
+            return float(self.data[start:self.pos])
+
+        if c == ord('.'):
+            if self.pos + 1 >= self.n or not (ord('0') <= self.s[self.pos + 1] <= ord('9')):
+                raise _calc_error("无法解析数字：%r" % '.')
+            start = self.pos
+            self.pos += 1
+            while self.pos < self.n and ord('0') <= self.s[self.pos] <= ord('9'):
+                self.pos += 1
+            return float(self.data[start:self.pos])
+
+        # 走到这儿说明在需要操作数的位置碰到了别的字符；报错要和纯
+        # Python 路径一致——')' 和二元运算符都是合法字符，不能笼统地
+        # 归成"非法字符"
+        # 在需要操作数的位置碰到了别的字符。_prescan 已经筛掉非法字符和
+        # 失配括号，剩下的（"()"、"(1+)"、"+1" 的运算符等）都是缺操作数，
+        # 和纯 Python 路径一样报"表达式不完整"；非法字符的分支只是兜底
+        if c == ord(')') or c == ord('+') or c == ord('*') or c == ord('/'):
+            raise _calc_error("表达式不完整")
+        raise _calc_error("包含非法字符：%r" % chr(c))
+
+    cdef double parse_expr(self, int min_prec) except *:
+        cdef double left, right
+        cdef char c
+        cdef int prec
+
+        left = self.parse_primary()
+        while True:
+            self.skip_ws()
+            if self.pos >= self.n:
+                break
+            c = self.s[self.pos]
+            if c == ord('+') or c == ord('-'):
+                prec = 1
+            elif c == ord('*') or c == ord('/'):
+                prec = 2
+            else:
+                break
+            if prec < min_prec:
+                break
+
+            self.pos += 1
+            right = self.parse_expr(prec + 1)  # 左结合
+            if c == ord('+'):
+                left = left + right
+            elif c == ord('-'):
+                left = left - right
+            elif c == ord('*'):
+                left = left * right
+            else:
+                if right == 0:
+                    raise _calc_error("除数不能为 0")
+                left = left / right
+
+        return left
+
+
+# 递归下降每层括号都占一截 C 栈，嵌套太深会把栈打穿、直接段错误。
+# 超过这个深度就主动抛 RecursionError，calculator.py 捕获后改走迭代
+# 的纯 Python 流水线，结果不受影响
+cdef int _MAX_DEPTH = 1000
+
+
+cdef void _prescan(const char* s, Py_ssize_t n) except *:
+    # 对齐纯 Python 路径的报错优先级：那边先整体切词（非法字符、坏数字
+    # 字面量从左到右最先报），再跑调度场（并排操作数、括号失配按出现
+    # 位置报），再做整体的缺操作数校验，最后才求值（除零）。递归下降
+    # 是边扫边算，顺序天然不同，所以先用几遍纯 C 的预扫描把前几类错
+    # 按同样的顺序筛掉，真正解析时只剩除零一种错误
+    cdef Py_ssize_t i = 0
+    cdef char c
+    cdef int depth = 0
+    cdef bint after_operand = False
+    cdef bint expect_operand = True
+
+    # 第一遍对应 _scan：非法字符和起不了头的 '.'
+    while i < n:
+        c = s[i]
+        if ord('0') <= c <= ord('9'):
+            i += 1
+            while i < n and ord('0') <= s[i] <= ord('9'):
+                i += 1
+            if i < n and s[i] == ord('.'):
+                i += 1
+                while i < n and ord('0') <= s[i] <= ord('9'):
+                    i += 1
+        elif c == ord('.'):
+            if i + 1 >= n or not (ord('0') <= s[i + 1] <= ord('9')):
+                raise _calc_error("无法解析数字：%r" % '.')
+            i += 2
+            while i < n and ord('0') <= s[i] <= ord('9'):
+                i += 1
+        elif c == ord('+') or c == ord('-') or c == ord('*') or c == ord('/') \
+                or c == ord('(') or c == ord(')') or c == 32 or (9 <= c <= 13):
+            i += 1
+        else:
+            raise _calc_error("包含非法字符：%r" % chr(c))
+
+    # 第二遍对应 _shunt：数字/左括号不能紧跟在收尾了操作数的 token
+    # 后面，右括号必须有搭档；空白不隔断相邻判断。数字要按和第一遍
+    # 相同的文法切，"1.2.3" 才能在第二个字面量处报并排错
+    i = 0
+    while i < n:
+        c = s[i]
+        if ord('0') <= c <= ord('9'):
+            if after_operand:
+                raise _calc_error("表达式不完整")
+            i += 1
+            while i < n and ord('0') <= s[i] <= ord('9'):
+                i += 1
+            if i < n and s[i] == ord('.'):
+                i += 1
+                while i < n and ord('0') <= s[i] <= ord('9'):
+                    i += 1
+            after_operand = True
+        elif c == ord('.'):
+            if after_operand:
+                raise _calc_error("表达式不完整")
+            i += 1
+            while i < n and ord('0') <= s[i] <= ord('9'):
+                i += 1
+            after_operand = True
+        elif c == ord('('):
+            if after_operand:
+                raise _calc_error("表达式不完整")
+            depth += 1
+            if depth > _MAX_DEPTH:
+                raise RecursionError("括号嵌套太深")
+            after_operand = False
+            i += 1
+        elif c == ord(')'):
+            if depth == 0:
+                raise _calc_error("括号不匹配")
+            depth -= 1
+            after_operand = True
+            i += 1
+        elif c == ord('+') or c == ord('-') or c == ord('*') or c == ord('/'):
+            after_operand = False
+            i += 1
+        else:
+            i += 1  # 空白
+
+    if depth != 0:
+        raise _calc_error("括号不匹配")
+
+    # 第三遍对应编译期的形状校验：每个二元运算符两侧、每对括号里面
+    # 都得有操作数；'-' 在等操作数的位置当一元负号。这些错 Python 端
+    # 都在整串扫完之后才报，所以单独放最后一遍
+    i = 0
+    while i < n:
+        c = s[i]
+        if ord('0') <= c <= ord('9') or c == ord('.'):
+            i += 1
+            while i < n and (ord('0') <= s[i] <= ord('9') or s[i] == ord('.')):
+                i += 1
+            expect_operand = False
+        elif c == ord('-'):
+            if not expect_operand:
+                expect_operand = True  # 二元减号
+            i += 1
+        elif c == ord('+') or c == ord('*') or c == ord('/'):
+            if expect_operand:
+                raise _calc_error("表达式不完整")
+            expect_operand = True
+            i += 1
+        elif c == ord('('):
+            expect_operand = True
+            i += 1
+        elif c == ord(')'):
+            if expect_operand:
+                raise _calc_error("表达式不完整")
+            i += 1
+        else:
+            i += 1  # 空白
+
+    if expect_operand:
+        raise _calc_error("表达式不完整")
+
+
+def calculate(str expr):
+    cdef bytes data
+    cdef _Parser p
+    cdef double v
+
+    try:
+        data = expr.encode("ascii")
+    except UnicodeEncodeError as e:
+        raise _calc_error("包含非法字符：%r" % expr[e.start]) from None
+
+    _prescan(data, len(data))
+    p = _Parser(data)
+    v = p.parse_expr(1)
+    p.skip_ws()
+    if p.pos < p.n:
+        # 预扫描之后这里只可能是并排的操作数（数字、'.'、'('），等价于
+        # 缺了把它们连起来的运算符
+        raise _calc_error("表达式不完整")
+    return v
@@ -1,188 +1,621 @@
 from __future__ import annotations
 
+import math
+import operator
 import re
-from dataclasses import dataclass
-from typing import Iterable, List, Optional, Sequence, Tuple
+from array import array
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Sequence, TextIO, Tuple
+
+# 可选加速：装了 numpy 时求值栈用 float64 缓冲，批量归约走 SIMD；
+# 再装上 numba，整个求值循环会被编译成机器码。都没装就走纯 Python
+# 实现，行为一致
+try:
+    import numpy as _np
+except ImportError:
+    _np = None
+
+if _np is not None:
+    try:
+        from numba import njit as _njit
+    except ImportError:
+        _njit = None
+else:
+    _njit = None
 
 
 class CalcError(Exception):
     pass
 
 
-@dataclass(frozen=True)
-class Token:
-    kind: str
-    value: str
+# 可选加速：编译过 _calc 扩展（python setup.py build_ext --inplace）时，
+# 整条扫描 + 求值流水线直接跑 C 实现。把 CalcError 注入给扩展，
+# 保证两条路径抛同一个异常类
+try:
+    import _calc
+except ImportError:
+    _c_calculate = None
+else:
+    _calc.set_error_class(CalcError)
+    _c_calculate = _calc.calculate
+
+
+# token kind 码：compile_expr 单遍扫描时用来记录上一个 token 的类别
+K_NUM = 0
+K_OP = 1
+K_LPAREN = 2
+K_RPAREN = 3
+K_START = 4  # 表达式开头的哨兵
+
+# 按 kind 码索引：上一个 token 是该类别时，'-' 解析为一元负号
+_IS_UNARY_AFTER = (False, True, True, False, True)
+
+# 按 kind 码索引：上一个 token 是该类别时，它收尾了一个操作数——紧跟
+# 数字或左括号就是两个操作数并排（"2 5"、"3(4)"），缺运算符连接
+_ENDS_OPERAND = (True, False, False, True, False)
+
+# RPN 程序的操作码：compile_expr 产出 (ops, nums, counts) 三个紧凑数组，
+# OP_PUSH 依次消费 nums 中的一个浮点数
+OP_ADD = 0
+OP_SUB = 1
+OP_MUL = 2
+OP_DIV = 3
+OP_NEG = 4
+OP_PUSH = 5
+# 带个数参数的批量归约：连串的 + / * 在编译时合并成一条指令，
+# 归约的个数依次从 counts 数组读取
+OP_ADD_N = 6
+OP_MUL_N = 7
+
+_OP_CODE = {
+    "+": OP_ADD,
+    "-": OP_SUB,
+    "*": OP_MUL,
+    "/": OP_DIV,
+}
 
+# 字符分类码：_scan 按 ord(ch) 查表分发
+_C_BAD = 0
+_C_WS = 1
+_C_NUM = 2  # 数字或小数点
+_C_OP = 3
+_C_LP = 4
+_C_RP = 5
 
-_TOKEN_RE = re.compile(
-    r"\s*(?:(?P<NUMBER>(?:\d+(?:\.\d*)?|\.\d+))|(?P<OP>[+\-*/])|(?P<LPAREN>\()|(?P<RPAREN>\))|(?P<MISMATCH>.+))"
-)
 
+def _make_class_table() -> bytes:
+    table = bytearray([_C_BAD] * 128)
+    for ch in " \t\r\n\f\v":
+        table[ord(ch)] = _C_WS
+    for ch in "0123456789.":
+        table[ord(ch)] = _C_NUM
+    for ch in "+-*/":
+        table[ord(ch)] = _C_OP
+    table[ord("(")] = _C_LP
+    table[ord(")")] = _C_RP
+    return bytes(table)
 
-def tokenize(expr: str) -> List[Token]:
-    tokens: List[Token] = []
-    pos = 0
-    while pos < len(expr):
-        m = _TOKEN_RE.match(expr, pos)
-        if not m:
-            raise CalcError(f"无法解析输入：{expr!r}")
-        pos = m.end()
-
-        kind = m.lastgroup
-        if kind is None:
-            raise CalcError("内部错误：tokenizer")
-
-        if kind == "NUMBER":
-            tokens.append(Token("NUMBER", m.group(kind)))
-        elif kind == "OP":
-            tokens.append(Token("OP", m.group(kind)))
-        elif kind == "LPAREN":
-            tokens.append(Token("LPAREN", "("))
-        elif kind == "RPAREN":
-            tokens.append(Token("RPAREN", ")"))
-        elif kind == "MISMATCH":
-            bad = m.group(kind)
-            raise CalcError(f"包含非法字符：{bad!r}")
-
-    return tokens
-
-
-_PRECEDENCE = {
-    "+": 1,
-    "-": 1,
-    "*": 2,
-    "/": 2,
-    "u-": 3,  # unary minus
-}
 
-_ASSOC = {
-    "+": "L",
-    "-": "L",
-    "*": "L",
-    "/": "L",
-    "u-": "R",
-}
+_CLASS = _make_class_table()
 
+# 数字字面量整段交给 re 的 C 引擎一次 match 完成，扫描循环只负责分发；
+# 形如 "1." / ".5" 都合法，单独一个 "." 不是数字
+_NUM_RE = re.compile(r"\d+(?:\.\d*)?|\.\d+", re.ASCII)
 
-def _is_unary_minus(tokens: Sequence[Token], i: int) -> bool:
-    t = tokens[i]
-    if t.kind != "OP" or t.value != "-":
-        return False
-    if i == 0:
-        return True
-    prev = tokens[i - 1]
-    return prev.kind in {"OP", "LPAREN"}
 
+# 按操作码索引（OP_ADD..OP_NEG）的优先级和左结合标记；一元负号右结合
+_PREC_BY_CODE = (1, 1, 2, 2, 3)
+_LEFT_BY_CODE = (True, True, True, True, False)
 
-def to_rpn(tokens: Sequence[Token]) -> List[Token]:
-    output: List[Token] = []
-    stack: List[Token] = []
+# 运算符栈上的左括号标记，配套优先级 0 保证不会被比较弹出
+_LP = -1
+_LP_PREC = 0
 
-    i = 0
-    while i < len(tokens):
-        t = tokens[i]
 
-        if t.kind == "NUMBER":
-            output.append(t)
-        elif t.kind == "OP":
-            op = "u-" if _is_unary_minus(tokens, i) else t.value
-            op_token = Token("OP", op)
+def _scan(expr: str) -> Tuple[str, array]:
+    # 切词：数字解析进 nums，其余 token 压成"骨架"字符串（数字一律记作
+    # '#'，空白丢弃）。骨架既是调度场的输入，也是模板缓存的键
+    skel: List[str] = []
+    nums = array("d")
 
-            while stack:
-                top = stack[-1]
-                if top.kind != "OP":
-                    break
-                p_top = _PRECEDENCE[top.value]
-                p_cur = _PRECEDENCE[op]
-                if (p_top > p_cur) or (p_top == p_cur and _ASSOC[op] == "L"):
-                    output.append(stack.pop())
-                else:
-                    break
+    # 热循环里把 len、全局表和绑定方法都提成局部变量：LOAD_FAST 比
+    # LOAD_GLOBAL / 每次重新解析属性便宜，循环按字符跑一遍很划算
+    n = len(expr)
+    cls = _CLASS
+    num_match = _NUM_RE.match
+    skel_append = skel.append
+    nums_append = nums.append
 
-            stack.append(op_token)
-        elif t.kind == "LPAREN":
-            stack.append(t)
-        elif t.kind == "RPAREN":
-            while stack and stack[-1].kind != "LPAREN":
-                output.append(stack.pop())
-            if not stack or stack[-1].kind != "LPAREN":
+    pos = 0
+    while pos < n:
+        ch = expr[pos]
+        code = cls[ord(ch)] if ord(ch) < 128 else _C_BAD
+
+        if code == _C_NUM:
+            m = num_match(expr, pos)
+            if m is None:
+                raise CalcError(f"无法解析数字：{ch!r}")
+            nums_append(float(m.group()))
+            skel_append("#")
+            pos = m.end()
+        elif code == _C_WS:
+            pos += 1
+        elif code == _C_BAD:
+            raise CalcError(f"包含非法字符：{ch!r}")
+        else:
+            skel_append(ch)
+            pos += 1
+
+    return "".join(skel), nums
+
+
+def _emit_op(ops: array, counts: array, op: int, osp: int, csp: int) -> Tuple[int, int]:
+    # 发射一个运算符操作码，返回更新后的 (osp, csp) 写游标；连串的 + / *
+    # 在这里被合并成带个数参数的 OP_ADD_N / OP_MUL_N，求值端可以一次
+    # 批量归约完成整串
+    if op == OP_ADD:
+        fused = OP_ADD_N
+    elif op == OP_MUL:
+        fused = OP_MUL_N
+    else:
+        ops[osp] = op
+        return osp + 1, csp
+
+    if osp >= 2 and ops[osp - 1] == OP_PUSH:
+        prev = ops[osp - 2]
+        if prev == op:
+            # [... op PUSH] op  →  [... PUSH fused]，归约 3 个
+            ops[osp - 2] = OP_PUSH
+            ops[osp - 1] = fused
+            counts[csp] = 3
+            return osp, csp + 1
+        if prev == fused and counts[csp - 1] < 127:
+            # [... fused PUSH] op  →  [... PUSH fused]，归约个数 +1
+            ops[osp - 2] = OP_PUSH
+            ops[osp - 1] = fused
+            counts[csp - 1] += 1
+            return osp, csp
+
+    ops[osp] = op
+    return osp + 1, csp
+
+
+def _shunt(skel: str) -> Tuple[array, array]:
+    # 调度场（shunting-yard）：把骨架串编译成操作码数组 + 归约个数数组。
+    # 输出和运算符栈都按 len(skel) 一次性预分配、用整数游标读写：每个
+    # 骨架字符至多产出一条输出、至多入栈一次，这是个安全上界，省掉了
+    # append 触发的 list/array 扩容重分配
+    n = len(skel)
+    ops = array("b", bytes(n))
+    counts = array("b", bytes(n))
+    # 运算符栈拆成两个平行 int 栈：操作码 + 优先级，弹栈条件只比较整数
+    stack_ops = [0] * n
+    stack_prec = [0] * n
+    osp = 0  # ops 写游标
+    csp = 0  # counts 写游标
+    ssp = 0  # 运算符栈深度
+    prev_kind = K_START
+
+    # 同 _scan：热循环里全局表和辅助函数提成局部变量
+    emit = _emit_op
+    is_unary_after = _IS_UNARY_AFTER
+    ends_operand = _ENDS_OPERAND
+    op_code = _OP_CODE
+    prec_by_code = _PREC_BY_CODE
+    left_by_code = _LEFT_BY_CODE
+
+    for ch in skel:
+        if ch == "#":
+            if ends_operand[prev_kind]:
+                raise CalcError("表达式不完整")
+            ops[osp] = OP_PUSH
+            osp += 1
+            prev_kind = K_NUM
+        elif ch == "(":
+            if ends_operand[prev_kind]:
+                raise CalcError("表达式不完整")
+            stack_ops[ssp] = _LP
+            stack_prec[ssp] = _LP_PREC
+            ssp += 1
+            prev_kind = K_LPAREN
+        elif ch == ")":
+            while ssp and stack_ops[ssp - 1] != _LP:
+                ssp -= 1
+                osp, csp = emit(ops, counts, stack_ops[ssp], osp, csp)
+            if not ssp:
                 raise CalcError("括号不匹配")
-            stack.pop()  # pop LPAREN
+            ssp -= 1  # 弹掉左括号
+            prev_kind = K_RPAREN
         else:
-            raise CalcError(f"未知 token：{t}")
+            op = op_code[ch]
+            if op == OP_SUB and is_unary_after[prev_kind]:
+                op = OP_NEG
+
+            p_cur = prec_by_code[op]
+            left = left_by_code[op]
+            while ssp:
+                p_top = stack_prec[ssp - 1]
+                if (p_top > p_cur) or (p_top == p_cur and left):
+                    ssp -= 1
+                    osp, csp = emit(ops, counts, stack_ops[ssp], osp, csp)
+                else:
+                    break
 
-        i += 1
+            stack_ops[ssp] = op
+            stack_prec[ssp] = p_cur
+            ssp += 1
+            prev_kind = K_OP
 
-    while stack:
-        top = stack.pop()
-        if top.kind in {"LPAREN", "RPAREN"}:
+    while ssp:
+        ssp -= 1
+        top = stack_ops[ssp]
+        if top == _LP:
             raise CalcError("括号不匹配")
-        output.append(top)
+        osp, csp = emit(ops, counts, top, osp, csp)
+
+    # 形状校验：逐条模拟栈深，缺操作数在编译期就报出来。拖到求值中途
+    # 的话，残缺程序可能先撞上别的错误（比如除零），报错和 C 扩展路径
+    # 对不上。形状只取决于骨架，这个检查跟着进骨架缓存，每种形状只跑
+    # 一次
+    depth = 0
+    ci = 0
+    for i in range(osp):
+        op = ops[i]
+        if op == OP_PUSH:
+            depth += 1
+        elif op == OP_NEG:
+            if depth < 1:
+                raise CalcError("表达式不完整")
+        elif op <= OP_DIV:
+            if depth < 2:
+                raise CalcError("表达式不完整")
+            depth -= 1
+        else:  # OP_ADD_N / OP_MUL_N
+            k = counts[ci]
+            ci += 1
+            if depth < k:
+                raise CalcError("表达式不完整")
+            depth -= k - 1
+    if depth != 1:
+        raise CalcError("表达式不完整")
 
-    return output
+    return ops[:osp], counts[:csp]
+
+
+# 折叠结果统一用这两个共享数组当程序骨架（约定程序只读，可以共享）
+_FOLDED_OPS = array("b", (OP_PUSH,))
+_EMPTY_COUNTS = array("b")
+
+
+def _fold_constants(ops: array, nums: array, counts: array) -> Tuple[array, array, array]:
+    # 常量折叠：这个计算器没有变量，所有操作数都是常量，能在编译期
+    # 把整个程序收缩成一条 PUSH。除零在这里提前抛出（对调用方来说和
+    # 求值期抛出没有区别）；栈型不对的程序原样返回，错误信息仍由
+    # 求值端统一给出。注意要放在骨架缓存之后跑：折叠结果依赖具体
+    # 数字，不能进以骨架为键的缓存
+    if len(ops) <= 1:
+        return ops, nums, counts
+
+    stk = [0.0] * len(nums)
+    sp = 0
+    ni = 0
+    ci = 0
+
+    for op in ops:
+        if op == OP_PUSH:
+            stk[sp] = nums[ni]
+            ni += 1
+            sp += 1
+        elif op <= OP_DIV:  # 二元运算
+            if sp < 2:
+                return ops, nums, counts
+            sp -= 1
+            stk[sp - 1] = _BIN_OPS[op](stk[sp - 1], stk[sp])
+        elif op == OP_NEG:
+            if sp < 1:
+                return ops, nums, counts
+            stk[sp - 1] = -stk[sp - 1]
+        elif op == OP_ADD_N:
+            k = counts[ci]
+            ci += 1
+            if sp < k:
+                return ops, nums, counts
+            base = sp - k
+            stk[base] = sum(stk[base:sp])
+            sp = base + 1
+        elif op == OP_MUL_N:
+            k = counts[ci]
+            ci += 1
+            if sp < k:
+                return ops, nums, counts
+            base = sp - k
+            stk[base] = math.prod(stk[base:sp])
+            sp = base + 1
+        else:
+            return ops, nums, counts
+
+    if sp != 1:
+        return ops, nums, counts
+    return _FOLDED_OPS, array("d", (stk[0],)), _EMPTY_COUNTS
+
+
+# 骨架 → (ops, counts) 的 LRU 缓存：用户只改数字、不改结构时（GUI 里把
+# 1+2 改成 1+9 这类），命中后只需重扫数字，不用重新跑调度场
+_SKEL_CACHE: OrderedDict[str, Tuple[array, array]] = OrderedDict()
+_SKEL_CACHE_MAX = 256
+
+
+def compile_expr(expr: str) -> Tuple[array, array, array]:
+    skel, nums = _scan(expr)
+
+    cached = _SKEL_CACHE.get(skel)
+    if cached is not None:
+        _SKEL_CACHE.move_to_end(skel)
+        ops, counts = cached
+    else:
+        ops, counts = _shunt(skel)
+        _cache_put(_SKEL_CACHE, skel, (ops, counts), _SKEL_CACHE_MAX)
+
+    return _fold_constants(ops, nums, counts)
+
+
+# numba 内核不直接抛异常，返回状态码由包装函数翻译成 CalcError
+_EVAL_OK = 0
+_EVAL_INCOMPLETE = 1
+_EVAL_DIV0 = 2
+_EVAL_BAD_OP = 3
+
+if _njit is not None:
+
+    @_njit(cache=True)
+    def _eval_program_nb(ops, nums, counts):
+        # 栈深不会超过压入的数字个数，即 len(nums)
+        stk = _np.empty(nums.shape[0], _np.float64)
+        sp = 0
+        ni = 0
+        ci = 0
+
+        for i in range(ops.shape[0]):
+            op = ops[i]
+            if op == OP_PUSH:
+                stk[sp] = nums[ni]
+                ni += 1
+                sp += 1
+            elif op == OP_ADD:
+                if sp < 2:
+                    return _EVAL_INCOMPLETE, 0.0
+                sp -= 1
+                stk[sp - 1] = stk[sp - 1] + stk[sp]
+            elif op == OP_MUL:
+                if sp < 2:
+                    return _EVAL_INCOMPLETE, 0.0
+                sp -= 1
+                stk[sp - 1] = stk[sp - 1] * stk[sp]
+            elif op == OP_SUB:
+                if sp < 2:
+                    return _EVAL_INCOMPLETE, 0.0
+                sp -= 1
+                stk[sp - 1] = stk[sp - 1] - stk[sp]
+            elif op == OP_DIV:
+                if sp < 2:
+                    return _EVAL_INCOMPLETE, 0.0
+                sp -= 1
+                if stk[sp] == 0:
+                    return _EVAL_DIV0, 0.0
+                stk[sp - 1] = stk[sp - 1] / stk[sp]
+            elif op == OP_NEG:
+                if sp < 1:
+                    return _EVAL_INCOMPLETE, 0.0
+                stk[sp - 1] = -stk[sp - 1]
+            elif op == OP_ADD_N:
+                k = counts[ci]
+                ci += 1
+                if sp < k:
+                    return _EVAL_INCOMPLETE, 0.0
+                acc = 0.0
+                for j in range(sp - k, sp):
+                    acc += stk[j]
+                sp -= k
+                stk[sp] = acc
+                sp += 1
+            elif op == OP_MUL_N:
+                k = counts[ci]
+                ci += 1
+                if sp < k:
+                    return _EVAL_INCOMPLETE, 0.0
+                acc = 1.0
+                for j in range(sp - k, sp):
+                    acc *= stk[j]
+                sp -= k
+                stk[sp] = acc
+                sp += 1
+            else:
+                return _EVAL_BAD_OP, 0.0
+
+        if sp != 1:
+            return _EVAL_INCOMPLETE, 0.0
+        return _EVAL_OK, stk[0]
+
+
+def eval_rpn(ops: array, nums: array, counts: array) -> float:
+    if _njit is not None:
+        status, value = _eval_program_nb(
+            _np.frombuffer(ops, _np.int8),
+            _np.frombuffer(nums, _np.float64),
+            _np.frombuffer(counts, _np.int8),
+        )
+        if status == _EVAL_OK:
+            return value
+        if status == _EVAL_DIV0:
+            raise CalcError("除数不能为 0")
+        if status == _EVAL_BAD_OP:
+            raise CalcError("不支持的操作码")
+        raise CalcError("表达式不完整")
+    return _eval_program_py(ops, nums, counts)
+
+
+def _div(a: float, b: float) -> float:
+    if b == 0:
+        raise CalcError("除数不能为 0")
+    return a / b
+
+
+# 按操作码索引的二元运算（OP_ADD..OP_DIV）；operator.* 是 C 层实现，
+# 比逐个字符串/整数比较的 if/elif 链少走分支
+_BIN_OPS = (operator.add, operator.sub, operator.mul, _div)
+
+
+def _eval_program_py(ops: array, nums: array, counts: array) -> float:
+    # 预分配栈并用 sp 游标读写，不走 list.append/pop；
+    # 栈深不会超过压入的数字个数，即 len(nums)。
+    # 有 numpy 时栈用 float64 缓冲，OP_ADD_N / OP_MUL_N 走 SIMD 归约
+    if _np is not None:
+        stk = _np.empty(len(nums), _np.float64)
+    else:
+        stk = [0.0] * len(nums)
+    sp = 0
+    ni = 0
+    ci = 0
+
+    for op in ops:
+        if op == OP_PUSH:
+            stk[sp] = nums[ni]
+            ni += 1
+            sp += 1
+        elif op <= OP_DIV:  # 二元运算
+            if sp < 2:
+                raise CalcError("表达式不完整")
+            sp -= 1
+            stk[sp - 1] = _BIN_OPS[op](stk[sp - 1], stk[sp])
+        elif op == OP_NEG:
+            if sp < 1:
+                raise CalcError("表达式不完整")
+            stk[sp - 1] = -stk[sp - 1]
+        elif op == OP_ADD_N:
+            k = counts[ci]
+            ci += 1
+            if sp < k:
+                raise CalcError("表达式不完整")
+            base = sp - k
+            if _np is not None:
+                v = stk[base:sp].sum()
+            else:
+                v = sum(stk[base:sp])
+            stk[base] = v
+            sp = base + 1
+        elif op == OP_MUL_N:
+            k = counts[ci]
+            ci += 1
+            if sp < k:
+                raise CalcError("表达式不完整")
+            base = sp - k
+            if _np is not None:
+                v = stk[base:sp].prod()
+            else:
+                v = math.prod(stk[base:sp])
+            stk[base] = v
+            sp = base + 1
+        else:
+            raise CalcError(f"不支持的操作码：{op}")
 
+    if sp != 1:
+        raise CalcError("表达式不完整")
+    return float(stk[0])
 
-def eval_rpn(rpn: Sequence[Token]) -> float:
-    st: List[float] = []
 
-    def pop1() -> float:
-        if not st:
-            raise CalcError("表达式不完整")
-        return st.pop()
+# calculate 结果的 LRU 缓存：REPL/GUI 反复提交同一表达式时 O(1) 命中。
+# 出错的表达式也记下错误信息，避免反复解析必然失败的输入
+_RESULT_CACHE: OrderedDict[str, Tuple[bool, object]] = OrderedDict()
+_RESULT_CACHE_MAX = 256
 
-    def pop2() -> Tuple[float, float]:
-        b = pop1()
-        a = pop1()
-        return a, b
+# 已编译 (ops, nums, counts) 程序的 LRU 缓存：结果缓存淘汰后再遇到
+# 同一表达式只需重新求值，不必重新编译；程序求值时只读，可以安全共享
+_PROG_CACHE: OrderedDict[str, Tuple[array, array, array]] = OrderedDict()
+_PROG_CACHE_MAX = 256
 
-    for t in rpn:
-        if t.kind == "NUMBER":
-            st.append(float(t.value))
-            continue
 
-        if t.kind != "OP":
-            raise CalcError("RPN 解析错误")
-
-        if t.value == "u-":
-            a = pop1()
-            st.append(-a)
-        elif t.value == "+":
-            a, b = pop2()
-            st.append(a + b)
-        elif t.value == "-":
-            a, b = pop2()
-            st.append(a - b)
-        elif t.value == "*":
-            a, b = pop2()
-            st.append(a * b)
-        elif t.value == "/":
-            a, b = pop2()
-            if b == 0:
-                raise CalcError("除数不能为 0")
-            st.append(a / b)
-        else:
-            raise CalcError(f"不支持的运算符：{t.value}")
-
-    if len(st) != 1:
-        raise CalcError("表达式不完整")
-    return st[0]
+def _cache_put(cache: OrderedDict, key: str, value: object, maxsize: int) -> None:
+    cache[key] = value
+    if len(cache) > maxsize:
+        cache.popitem(last=False)
 
 
 def calculate(expr: str) -> float:
-    tokens = tokenize(expr)
-    rpn = to_rpn(tokens)
-    return eval_rpn(rpn)
+    hit = _RESULT_CACHE.get(expr)
+    if hit is not None:
+        _RESULT_CACHE.move_to_end(expr)
+        ok, payload = hit
+        if ok:
+            return payload
+        raise CalcError(payload)
+
+    try:
+        if _c_calculate is not None:
+            try:
+                value = _c_calculate(expr)
+            except RecursionError:
+                # C 扩展是递归下降，括号嵌套太深会耗尽 C 栈，超限时它
+                # 主动抛 RecursionError；调度场是迭代的，这类表达式退回
+                # 纯 Python 流水线算
+                value = eval_rpn(*compile_expr(expr))
+        else:
+            prog = _PROG_CACHE.get(expr)
+            if prog is not None:
+                _PROG_CACHE.move_to_end(expr)
+                ops, nums, counts = prog
+            else:
+                ops, nums, counts = compile_expr(expr)
+                _cache_put(_PROG_CACHE, expr, (ops, nums, counts), _PROG_CACHE_MAX)
+            value = eval_rpn(ops, nums, counts)
+    except CalcError as e:
+        _cache_put(_RESULT_CACHE, expr, (False, str(e)), _RESULT_CACHE_MAX)
+        raise
+
+    _cache_put(_RESULT_CACHE, expr, (True, value), _RESULT_CACHE_MAX)
+    return value
 
 
 def _fmt_number(x: float) -> str:
-    # 处理像 2.0 这种输出，尽量展示为 2
-    if x.is_integer():
-        return str(int(x))
-    return str(x)
+    # 处理像 2.0 这种输出，尽量展示为 2。repr 一次 C 层调用拿到最短
+    # 往返表示，再剥掉结尾的 ".0"，省去 is_integer 分支和 int/str 分配
+    s = repr(x)
+    return s[:-2] if s.endswith(".0") else s
+
+
+# 退出命令提成模块级 frozenset：集合字面量每次进循环都要重建，
+# 提出来之后成员判断直接查现成的哈希表
+_QUIT_CMDS = frozenset({"q", "quit", "exit"})
+
+
+def _repl_batch(stdin: Iterable[str], stdout: TextIO) -> None:
+    # 管道/重定向输入：不打印横幅和提示符，逐行求值，输出攒在一起
+    # 最后一次性写出，省掉每行一次 print 的加锁开销
+    out: List[str] = []
+    for line in stdin:
+        s = line.strip()
+        if not s:
+            continue
+        if s.lower() in _QUIT_CMDS:
+            break
+        try:
+            out.append(_fmt_number(calculate(s)))
+        except CalcError as e:
+            out.append(f"错误：{e}")
+        except Exception as e:
+            out.append(f"未知错误：{e}")
+
+    if out:
+        stdout.write("\n".join(out) + "\n")
+    stdout.flush()
 
 
 def repl() -> None:
+    import sys
+
+    if not sys.stdin.isatty():
+        _repl_batch(sys.stdin, sys.stdout)
+        return
+
     print("简易计算器（支持 + - * / 和括号）")
     print("输入示例：1 + 2*(3-4) / -5")
     print("输入 q 退出\n")
@@ -196,7 +629,7 @@ def repl() -> None:
 
         if not s:
             continue
-        if s.lower() in {"q", "quit", "exit"}:
+        if s.lower() in _QUIT_CMDS:
             print("退出")
             return
 
@@ -1,13 +1,20 @@
 from __future__ import annotations
 
-import tkinter as tk
-from tkinter import ttk
+from typing import TYPE_CHECKING
 
 from calculator import CalcError, calculate
 
+# tkinter 拖着一大坨 C 扩展，导入相当慢；推迟到真正建窗口时再导，
+# 只 import 本模块（比如嵌进别的程序）就不用付这笔启动开销
+if TYPE_CHECKING:
+    import tkinter as tk
+
 
 class CalculatorApp:
     def __init__(self, root: tk.Tk) -> None:
+        import tkinter as tk
+        from tkinter import ttk
+
         self.root = root
         self.root.title("简易计算器")
         self.root.resizable(False, False)
@@ -65,6 +72,8 @@ class CalculatorApp:
         root.bind("<Escape>", lambda _e: self.on_clear())
 
     def on_insert(self, text: str) -> None:
+        import tkinter as tk
+
         try:
             index = self.expr_entry.index(tk.INSERT)
             self.expr_entry.insert(index, text)
@@ -95,6 +104,9 @@ class CalculatorApp:
 
 
 def main() -> int:
+    import tkinter as tk
+    from tkinter import ttk
+
     root = tk.Tk()
     # 使用系统主题（Windows 上默认看起来比较顺眼）
     try:
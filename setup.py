@@ -0,0 +1,10 @@
+from setuptools import Extension, setup
+
+from Cython.Build import cythonize
+
+# 只用于编译可选的 _calc 加速扩展：
+#   python setup.py build_ext --inplace
+setup(
+    name="yanshi-calculator",
+    ext_modules=cythonize([Extension("_calc", ["_calc.pyx"])]),
+)